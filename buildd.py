@@ -8,25 +8,31 @@ daemon and it relies on outside supervision to run continously. This
 makes some design decisions like restarting liberally easier to fathom.
 """
 
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple, TYPE_CHECKING
 
 import collections
+import concurrent.futures
 import configparser
 import email.utils
 import getpass
 import logging
 import os
 import platform
-import shutil
+import random
+import re
 import signal
 import socket
 import subprocess
 import threading
 import time
 
-from retrying import retry  # type: ignore
 import yaml
 
+# Prefer the libyaml-backed loader when PyYAML has been built against it.
+# It is considerably faster than the pure-Python implementation and
+# produces the same output.
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 _ARCHIVE_TO_DUPLOAD_TARGET = {
     'debian': 'rsync-ftp-master',
     'debian-security': 'rsync-security',
@@ -34,8 +40,65 @@ _ARCHIVE_TO_DUPLOAD_TARGET = {
     'default': 'loongbian',
 }
 
+# Upper bound for concurrent wanna-build queries. Through a control master
+# they are sessions multiplexed on one connection, which sshd limits with
+# MaxSessions (default 10); without one, sshd starts dropping connection
+# attempts beyond MaxStartups (default 10:30:100). Stay well below both as
+# an upload might be talking to wanna-build at the same time.
+_MAX_PARALLEL_QUERIES = 4
+
+# Packages are built in a subdirectory of this directory.
+_BUILD_ROOT = os.path.expanduser('~/build')
+
+# dupload is attempted this many times before the package is given back.
+# The delay between attempts (in seconds) doubles after every failure and
+# gets up to _DUPLOAD_RETRY_JITTER seconds added. In total upload() waits
+# for 7.5 to 9.5 minutes before giving up, about as long as with the
+# previous fixed delay of two minutes.
+_DUPLOAD_ATTEMPTS = 5
+_DUPLOAD_RETRY_DELAY = 30
+_DUPLOAD_RETRY_JITTER = 30
+
+# Keys that expire within this many seconds are not considered for signing.
+_KEY_MIN_VALIDITY = 24 * 60 * 60
+
+# The picked key is reused for signing until it gets this close (in
+# seconds) to being rejected by _pick_gpg_key.
+_KEY_CACHE_MARGIN = 60 * 60
+
+# Matches the sec and uid records of gpg's colon listing in order. For sec
+# records field 5 is the key ID and field 7 the expiry, for uid records
+# field 10 is the user ID. The listing is scanned undecoded.
+_GPG_RECORD_RE = re.compile(
+    rb'^(?:sec:(?:[^:]*:){3}(?P<keyid>[^:]*):[^:]*:(?P<expires>[^:]*):'
+    rb'|uid:(?:[^:]*:){8}(?P<uid>[^:]*):)', re.M)
+
+# wanna-build's take operation answers with a YAML document of this shape:
+#
+# ---
+# -
+#   <source package>:
+#     -
+#       <field>: <value>
+#     -
+#       ...
+#
+# These match the source package line and the field lines at exactly those
+# indentation levels. Values are only matched if they are plain scalars
+# that need no unquoting.
+_TAKE_PACKAGE_RE = re.compile(r'  (?P<package>[\w.+-]+):')
+_TAKE_FIELD_RE = re.compile(
+    r'      (?P<key>[\w-]+): (?P<value>[\w(][\w .@+~:()<>=/,|-]*)')
+
+# Used to check that YAML would read a plain scalar as a string rather than
+# e.g. a number or a boolean.
+_YAML_RESOLVER = yaml.resolver.Resolver()
+_YAML_STR_TAG = 'tag:yaml.org,2002:str'
+
 
 class Key:
+    __slots__ = ('keyid', 'expiry', 'email')
+
     def __init__(self, keyid: str, expiry: Optional[float]=None, email: Optional[str]=None) -> None:
         self.keyid = keyid
         self.expiry = expiry
@@ -47,36 +110,62 @@ class KeyNotFoundError(Exception):
 
 
 class Package:
-    build_dep_resolver = None  # type: Optional[str]
-    mail_logs = None  # type: Optional[str]
-    binnmu = None  # type: Optional[int]
-    binnmu_changelog = None  # type: Optional[str]
-    extra_depends = None  # type: Optional[str]
-    extra_conflicts = None  # type: Optional[str]
+    __slots__ = (
+        'builder',
+        'name',
+        'source_package',
+        'source_version',
+        'epochless_source_version',
+        'archive',
+        'architecture',
+        'distribution',
+        'build_dep_resolver',
+        'mail_logs',
+        'binnmu',
+        'binnmu_changelog',
+        'extra_depends',
+        'extra_conflicts',
+        'binary_version',
+        'epochless_binary_version',
+        'source_package_version',
+        'source_package_binary_version',
+        'changes_file',
+        'build_dir',
+    )
+
+    # Slots cannot have class-level defaults, so only declare the types of
+    # the attributes populated from _FIELD_MAP.
+    if TYPE_CHECKING:
+        build_dep_resolver = None  # type: Optional[str]
+        mail_logs = None  # type: Optional[str]
+        binnmu = None  # type: Optional[int]
+        binnmu_changelog = None  # type: Optional[str]
+        extra_depends = None  # type: Optional[str]
+        extra_conflicts = None  # type: Optional[str]
 
     # _FIELD_MAP maps YAML fields as returned by wanna-build's take operation
-    # to attributes on the object.
-    _FIELD_MAP = {
-        'build_dep_resolver': 'build_dep_resolver',
-        'mail_logs': 'mail_logs',
-        'binNMU': 'binnmu',
-        'extra-changelog': 'binnmu_changelog',
-        'extra-depends': 'extra_depends',
-        'extra-conflicts': 'extra_conflicts',
-    }
+    # to attributes on the object. It is only ever iterated, hence it is kept
+    # as a tuple of pairs.
+    _FIELD_MAP = (
+        ('build_dep_resolver', 'build_dep_resolver'),
+        ('mail_logs', 'mail_logs'),
+        ('binNMU', 'binnmu'),
+        ('extra-changelog', 'binnmu_changelog'),
+        ('extra-depends', 'extra_depends'),
+        ('extra-conflicts', 'extra_conflicts'),
+    )
 
     def __init__(self, builder, name: str, fields: Dict[str, str]) -> None:
         self.builder = builder
         self.name = name
         self.source_package, self.source_version = fields['pkg-ver'].split('_', 2)
-        self.epochless_source_version = self.source_version.split(':')[
-            1] if ':' in self.source_version else self.source_version
+        epoch, has_epoch, version = self.source_version.partition(':')
+        self.epochless_source_version = version if has_epoch else epoch
         self.archive = fields.get('archive', 'default')
         self.architecture = fields['arch']
         self.distribution = fields['suite']
-        for yaml_field, attr_name in self._FIELD_MAP.items():
-            setattr(self, attr_name, fields[yaml_field]
-                    if yaml_field in fields else None)
+        for yaml_field, attr_name in self._FIELD_MAP:
+            setattr(self, attr_name, fields.get(yaml_field))
 
         self.binary_version = self.source_version
         self.epochless_binary_version = self.epochless_source_version
@@ -85,34 +174,103 @@ class Package:
             self.binary_version += binnmu_suffix
             self.epochless_binary_version += binnmu_suffix
 
-        self.source_package_version = \
-            '{p.source_package}_{p.source_version}'.format(p=self)
-        self.source_package_binary_version = \
-            '{p.source_package}_{p.binary_version}'.format(p=self)
-        self.changes_file = \
-            '{p.source_package}_{p.epochless_binary_version}_{p.architecture}.changes' \
-                .format(p=self)
+        self.source_package_version = '{}_{}'.format(
+            self.source_package, self.source_version)
+        self.source_package_binary_version = '{}_{}'.format(
+            self.source_package, self.binary_version)
+        self.changes_file = '{}_{}_{}.changes'.format(
+            self.source_package, self.epochless_binary_version,
+            self.architecture)
+        self.build_dir = os.path.join(_BUILD_ROOT, '{}_{}'.format(
+            self.source_package, self.epochless_source_version))
 
     def __str__(self):
         return self.source_package_binary_version
 
+    def metadata(self) -> Dict[str, object]:
+        """Returns all attributes of the package, e.g. for logging."""
+        return {attr: getattr(self, attr) for attr in self.__slots__}
+
     def maintainer_email(self, key: Key):
         return self.builder.maintainer_email_template.format(
             pkg=self, builder=self.builder, key=key)
 
 
+def _run_bytes(args: List[str], check: bool = False) -> Tuple[int, bytes]:
+    """Wrap subprocess.run to capture the undecoded output."""
+    result = subprocess.run(args=args, stdout=subprocess.PIPE, check=check)
+    return result.returncode, result.stdout
+
+
 def _run(args: List[str], check: bool = False) -> Tuple[int, str]:
-    """Wrap subprocess.run to enable check/encoding on Python 3.5."""
-    result = subprocess.run(args=args, stdout=subprocess.PIPE)
-    if check and result.returncode != 0:
-        raise subprocess.CalledProcessError(result.returncode, args)
-    return result.returncode, result.stdout.decode('utf-8', 'strict')
+    """Wrap subprocess.run to enable encoding on Python 3.5.
 
+    The encoding argument of subprocess.run is only available from Python
+    3.6 onwards, hence the output is decoded explicitly.
+    """
+    returncode, stdout = _run_bytes(args, check=check)
+    return returncode, stdout.decode('utf-8', 'strict')
 
-def _pick_gpg_key(keylist: Optional[str] = None) -> Key:
-    if keylist is None:
-        _, keylist = _run(
-            args=['gpg', '--with-colons', '--list-secret-keys'], check=True)
+
+def _parse_take_fields(
+        response: str) -> Optional[Tuple[str, Dict[str, str]]]:
+    """Parses a take response with the expected layout without YAML.
+
+    Returns the source package and its fields, or None if the response
+    deviates from the layout in any way or contains anything that needs a
+    real YAML parser (e.g. quoting).
+    """
+    lines = response.splitlines()
+    if len(lines) < 5 or len(lines) % 2 == 0 or lines[:2] != ['---', '-']:
+        return None
+    package = _TAKE_PACKAGE_RE.fullmatch(lines[2])
+    if not package:
+        return None
+    data = {}  # type: Dict[str, str]
+    for marker, line in zip(lines[3::2], lines[4::2]):
+        field = _TAKE_FIELD_RE.fullmatch(line)
+        if marker != '    -' or not field:
+            return None
+        key, value = field.group('key', 'value')
+        # Reject what YAML would read as a nested mapping or refuse to
+        # parse, as well as trailing whitespace that YAML would strip.
+        if (': ' in value or value.endswith(':') or
+                value != value.rstrip() or
+                _YAML_RESOLVER.resolve(yaml.ScalarNode, value,
+                                       (True, False)) != _YAML_STR_TAG):
+            return None
+        data[key] = value
+    if 'status' not in data:
+        return None
+    return package.group('package'), data
+
+
+# A secret key as listed by gpg. expires is an absolute timestamp.
+_GpgKeyRecord = collections.namedtuple(
+    '_GpgKeyRecord', ['keyid', 'expires', 'email'])
+
+
+def _parse_gpg_keylist(keylist: bytes) -> List[_GpgKeyRecord]:
+    """Parses the secret keys out of gpg's colon listing.
+
+    Only the fields that are used get decoded.
+    """
+    records = []  # type: List[_GpgKeyRecord]
+    for record in _GPG_RECORD_RE.finditer(keylist):
+        uid = record.group('uid')
+        if uid is None:
+            records.append(_GpgKeyRecord(
+                keyid=record.group('keyid').decode('ascii'),
+                expires=float(record.group('expires')),
+                email=None))
+        elif records:
+            realname, email_address = email.utils.parseaddr(
+                uid.decode('utf-8', 'strict'))
+            records[-1] = records[-1]._replace(email=email_address)
+    return records
+
+
+def _pick_gpg_key_parsed(records: List[_GpgKeyRecord]) -> Key:
     # There might be multiple secret keys available. Most likely some
     # of them are already expired and some are not active yet. As a
     # heuristic pick the key with the closest expiry that is still
@@ -120,30 +278,22 @@ def _pick_gpg_key(keylist: Optional[str] = None) -> Key:
     # expiry is new and might not be active on the archive side yet.
     # Note that this code requires that the expiry is set, which is the
     # case for all of Debian's production keys.
-    keys = {}  # type: Dict[str, Key]
     t = time.time()
-    last_keyid = None  # type: Optional[str]
-    for line in keylist.splitlines():
-        if line.startswith('uid:') and last_keyid:
-            uid = line.split(':', 10)[9]
-            realname, email_address = email.utils.parseaddr(uid)
-            keys[last_keyid].email = email_address
-            continue
-        if not line.startswith('sec:'):
-            continue
-        parts = line.split(':', 7)
-        keyid = parts[4]
-        expires = parts[6]
-        # Reject keys that are already expired or are due to expire within
-        # the next 24h.
-        if t + 24 * 60 * 60 > float(expires):
-            continue
-        keys[keyid] = Key(keyid=keyid, expiry=float(expires) - t)
-        last_keyid = keyid
-    if not keys:
+    # Reject keys that are already expired or are due to expire within
+    # the next 24h.
+    usable = [r for r in records if t + _KEY_MIN_VALIDITY <= r.expires]
+    if not usable:
         raise KeyNotFoundError('No usable GPG key found.')
-    keyid = min(keys, key=lambda k: keys[k].expiry)
-    return keys[keyid]
+    record = min(usable, key=lambda r: r.expires)
+    return Key(keyid=record.keyid, expiry=record.expires - t,
+               email=record.email)
+
+
+def _pick_gpg_key(keylist: Optional[bytes] = None) -> Key:
+    if keylist is None:
+        _, keylist = _run_bytes(
+            ['gpg', '--with-colons', '--list-secret-keys'], check=True)
+    return _pick_gpg_key_parsed(_parse_gpg_keylist(keylist))
 
 
 class ConfigurationError(RuntimeError):
@@ -163,27 +313,56 @@ class Builder:
         self.wb_ssh_socket = config.get('wb_ssh_socket',
                                         'buildd.debian.org.ssh')
         self.wb_ssh_host = config.get('wb_ssh_host', 'buildd.debian.org')
+        # If set, ssh becomes the control master itself when the socket is
+        # missing and keeps the connection around for the given time
+        # (see ControlPersist in ssh_config(5)). By default the master is
+        # expected to be provided by buildd-ssh-master.service.
+        self.wb_ssh_control_persist = config.get(
+            'wb_ssh_control_persist')  # type: Optional[str]
+        control_options = (
+            '-o', 'ControlMaster=auto',
+            '-o', 'ControlPersist=' + self.wb_ssh_control_persist,
+        ) if self.wb_ssh_control_persist else ()
+        self._default_wannabuild_call = (
+            'ssh', '-l', self.wb_ssh_user, '-S', self.wb_ssh_socket,
+            *control_options,
+            self.wb_ssh_host, 'wanna-build', '--api=2',
+        )  # type: Tuple[str, ...]
         self.architectures = config['architectures'].split(' ')
         self.distributions = config.get('distributions', 'any').split(' ')
         self.idle_sleep_time = config.get('idle_sleep_time', 60)  # seconds
+        # sbuild's console output is written here rather than to our own
+        # stdout, which might be a pipe to a slow log consumer.
+        self.sbuild_output_dir = os.path.expanduser(
+            config.get('sbuild_output_dir', '~/logs'))
         self.hostname = hostname
         self.short_hostname = hostname.split('.')[0]
+        self._mail_from_email = 'buildd on {} <{}@{}>'.format(
+            self.short_hostname, getpass.getuser(), self.hostname)
         self.maintainer_email_template = config.get(
             'maintainer_email_template',
             '{pkg.architecture} Build Daemon ({builder.short_hostname}) '
             '<{key.email}>')
+        self._cached_key = None  # type: Optional[Tuple[Key, float]]
+        self._prefetched_listings = \
+            None  # type: Optional[List[concurrent.futures.Future]]
 
-    @property
-    def _mail_from_email(self) -> str:
-        return 'buildd on {} <{}@{}>'.format(
-            self.hostname.split('.')[0], getpass.getuser(), self.hostname)
+    def _current_key(self) -> Key:
+        """Returns the signing key, re-running gpg only when necessary.
 
-    @property
-    def _default_wannabuild_call(self) -> List[str]:
-        return [
-            'ssh', '-l', self.wb_ssh_user, '-S', self.wb_ssh_socket,
-            self.wb_ssh_host, 'wanna-build', '--api=2'
-        ]
+        _pick_gpg_key keeps picking the same key until it is about to
+        expire, so the result is cached until shortly before that point.
+        """
+        t = time.time()
+        if self._cached_key is not None:
+            key, valid_until = self._cached_key
+            if t < valid_until:
+                return key
+        key = _pick_gpg_key()
+        self._cached_key = (
+            key,
+            t + (key.expiry or 0) - _KEY_MIN_VALIDITY - _KEY_CACHE_MARGIN)
+        return key
 
     def _query_wannabuild(self, architecture: str, distribution: str,
                           *command) -> str:
@@ -191,9 +370,9 @@ class Builder:
         logging.debug('Querying for %s/%s: %s', architecture, distribution,
                       command)
         return _run(
-            args=self._default_wannabuild_call +
-            ['--arch=' + architecture, '--dist=' + distribution] +
-            list(command),
+            args=[*self._default_wannabuild_call,
+                  '--arch=' + architecture, '--dist=' + distribution,
+                  *command],
             check=True)[1]
 
     def _parse_take_response(self, response: str) -> Optional[Package]:
@@ -201,14 +380,17 @@ class Builder:
 
         The YAML is pretty awkwardly nested. The code mostly needs to
         unnest the data structure and then construct the proper object
-        from it.
+        from it. As the layout is fixed, most responses are parsed without
+        going through YAML at all.
         """
-        for source_package, descriptor in yaml.safe_load(response)[0].items():
-            data = {}  # type: Dict[str, str]
-            for elem in descriptor:
-                for k, v in elem.items():
-                    data[k] = v
-            break
+        fields = _parse_take_fields(response)
+        if fields is None:
+            parsed = yaml.load(response, Loader=_YAML_LOADER)[0]
+            source_package, descriptor = next(iter(parsed.items()))
+            data = {k: v for elem in descriptor
+                    for k, v in elem.items()}  # type: Dict[str, str]
+        else:
+            source_package, data = fields
         if data['status'] != 'ok':
             return None
         return Package(self, source_package, data)
@@ -219,6 +401,38 @@ class Builder:
         return self._parse_take_response(
             self._query_wannabuild(arch, dist, '--take', archdistpkgver))
 
+    def _list_needs_build(self) -> List[concurrent.futures.Future]:
+        """Starts listing the queues of all distributions and architectures.
+
+        The listings are fetched in parallel as most of them are usually
+        empty and each one costs a round trip to wanna-build. The returned
+        futures are in the configured order of distributions and
+        architectures.
+        """
+        pairs = [(arch, dist)
+                 for dist in self.distributions
+                 for arch in self.architectures]
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(pairs), _MAX_PARALLEL_QUERIES))
+        listings = [
+            executor.submit(self._query_wannabuild, arch, dist,
+                            '--list=needs-build')
+            for arch, dist in pairs
+        ]
+        # Pending queries still run to completion.
+        executor.shutdown(wait=False)
+        return listings
+
+    def prefetch(self) -> None:
+        """Starts listing the queues for the next package in the background.
+
+        This must only be called once wanna-build has been told the result
+        of the current build, otherwise it would still be listed in the
+        state it was taken in. Nothing is taken from the queues until the
+        next package is actually requested.
+        """
+        self._prefetched_listings = self._list_needs_build()
+
     def _get_next_wb(self) -> Optional[Package]:
         """Returns the next package to build or None if there is nothing to do.
 
@@ -228,32 +442,29 @@ class Builder:
         return the next package to build and the code would obey this
         decision regardless of the actual query.
         """
-        for dist in self.distributions:
-            for arch in self.architectures:
-                response = self._query_wannabuild(arch, dist,
-                                                  '--list=needs-build')
-                pending = response.split('\n')
-                if not pending[0]:
-                    continue
-                result = self._take(pending[0])
-                if result:
-                    return result
+        listings = self._prefetched_listings or self._list_needs_build()
+        self._prefetched_listings = None
+        # Do not leave any queries behind once a package has been picked.
+        concurrent.futures.wait(listings)
+        for listing in listings:
+            # Only the head of the queue is of interest.
+            first, _, _ = listing.result().partition('\n')
+            if not first:
+                continue
+            result = self._take(first)
+            if result:
+                return result
         return None
 
     def builds(self) -> Iterator[Optional[Package]]:
         """Returns an iterator of packages to build."""
         while True:
-            if _pick_gpg_key() is None:
+            if self._current_key() is None:
                 raise ConfigurationError('No valid GPG signing key found.')
             yield self._get_next_wb()
 
-    def _build_dir(self, pkg: Package):
-        return os.path.join(
-            os.path.expanduser('~/build'),
-            '{p.source_package}_{p.epochless_source_version}'.format(p=pkg))
-
     def _construct_sbuild_cmd(self, pkg: Package) -> List[str]:
-        key = _pick_gpg_key()
+        key = self._current_key()
         cmd = [
             'sbuild',
             '--apt-update',
@@ -271,28 +482,34 @@ class Builder:
             cmd.extend(['--arch={}'.format(pkg.architecture), '--no-arch-all'])
         else:
             cmd.extend(['--arch-all', '--no-arch-any'])
-        if pkg.build_dep_resolver:
-            cmd.append('--build-dep-resolver=' + pkg.build_dep_resolver)
-        if pkg.mail_logs:
-            cmd.append('--mail-log-to=' + pkg.mail_logs)
+        optional_args = (
+            ('--build-dep-resolver=', pkg.build_dep_resolver),
+            ('--mail-log-to=', pkg.mail_logs),
+            ('--add-depends=', pkg.extra_depends),
+            ('--add-conflicts=', pkg.extra_conflicts),
+        )
+        cmd.extend(flag + value for flag, value in optional_args if value)
         if pkg.binnmu and pkg.binnmu_changelog:
-            cmd.append('--binNMU={}'.format(pkg.binnmu))
-            cmd.append('--make-binNMU=' + pkg.binnmu_changelog)
-        if pkg.extra_depends:
-            cmd.append('--add-depends=' + pkg.extra_depends)
-        if pkg.extra_conflicts:
-            cmd.append('--add-conflicts=' + pkg.extra_conflicts)
+            cmd.extend(['--binNMU={}'.format(pkg.binnmu),
+                        '--make-binNMU=' + pkg.binnmu_changelog])
         cmd.append(pkg.source_package_version)
         return cmd
 
     def build(self, pkg: Package):
         """Builds a package using sbuild."""
         logging.info('Building %s...', pkg)
-        logging.debug('Metadata: %s', vars(pkg))
-        build_dir = self._build_dir(pkg)
+        logging.debug('Metadata: %s', pkg.metadata())
+        build_dir = pkg.build_dir
         os.makedirs(build_dir, exist_ok=True)
+        os.makedirs(self.sbuild_output_dir, exist_ok=True)
+        output_file = os.path.join(
+            self.sbuild_output_dir,
+            '{}_{}.sbuild-output'.format(pkg, pkg.architecture))
         cmd = self._construct_sbuild_cmd(pkg)
-        rc = subprocess.run(cmd, cwd=build_dir).returncode
+        logging.debug('Writing sbuild output to %s.', output_file)
+        with open(output_file, 'wb') as output:
+            rc = subprocess.run(cmd, cwd=build_dir, stdout=output,
+                                stderr=subprocess.STDOUT).returncode
         if rc == 0:
             logging.info('Build of %s succeeded.', pkg)
             result = 'built'
@@ -309,18 +526,29 @@ class Builder:
             pkg.source_package_binary_version)
         return True if result == 'built' else False
 
-    @retry(stop_max_attempt_number=5, wait_fixed=2 * 60 * 1000)
     def _run_dupload(self, target, cwd, filename):
-        try:
-            subprocess.run(
-                ['dupload', '--to', target, filename], check=True, cwd=cwd)
-        except:
-            # retrying has a logger attribute but the version in Debian
-            # Stretch is too old.
-            logging.exception('Failed to call dupload successfully.')
-            raise
+        for attempt in range(_DUPLOAD_ATTEMPTS):
+            try:
+                subprocess.run(
+                    ['dupload', '--to', target, filename], check=True, cwd=cwd)
+                return
+            except (subprocess.CalledProcessError, OSError):
+                logging.exception('Failed to call dupload successfully.')
+                if attempt == _DUPLOAD_ATTEMPTS - 1:
+                    raise
+            # Back off exponentially. The jitter avoids buildds hitting the
+            # upload target in lockstep after an outage.
+            time.sleep(_DUPLOAD_RETRY_DELAY * 2 ** attempt +
+                       random.uniform(0, _DUPLOAD_RETRY_JITTER))
 
     def upload(self, pkg: Package):
+        """Uploads a successfully built package using dupload.
+
+        dupload is invoked once per package with the .changes file, which
+        references everything else to upload. Uploads are deliberately not
+        batched across builds: wanna-build is told about each upload right
+        away and a failed upload only gives back a single package.
+        """
         logging.info('Uploading %s...', pkg)
         if pkg.archive not in _ARCHIVE_TO_DUPLOAD_TARGET:
             logging.error('Could not upload to %s: target not hardcoded.',
@@ -330,7 +558,7 @@ class Builder:
         try:
             self._run_dupload(
                 target,
-                self._build_dir(pkg),
+                pkg.build_dir,
                 pkg.changes_file)
             self._query_wannabuild(
                 pkg.architecture,
@@ -346,8 +574,10 @@ class Builder:
             raise
 
     def cleanup(self, pkg: Package):
-        if os.path.exists(self._build_dir(pkg)):
-            shutil.rmtree(self._build_dir(pkg))
+        # Build trees can contain tens of thousands of files, which rm
+        # removes much faster than shutil.rmtree. It also copes with the
+        # directory not existing.
+        subprocess.run(['rm', '-rf', '--', pkg.build_dir], check=True)
 
 
 def setup_exit_handler():
@@ -374,17 +604,21 @@ def handle_next_package(builder: Builder,
         logging.info('No more packages to build; exiting.')
         return False
 
-    # If there is nothing to do, back-off for a while.
+    # If there is nothing to do, back-off for a while. The wait returns
+    # early if we get signalled to exit in the meantime.
     if pkg is None:
         logging.info('Nothing to do, sleeping for %d seconds...',
                      builder.idle_sleep_time)
-        if not exit_event.is_set():
-            exit_event.wait(builder.idle_sleep_time)
+        exit_event.wait(builder.idle_sleep_time)
         return True
 
-    # We have something to do, so let's start building.
+    # We have something to do, so let's start building. wanna-build knows
+    # about the outcome once build returns, so the queues can be listed for
+    # the next package while the upload is still in progress.
     try:
         if builder.build(pkg):
+            if not exit_event.is_set():
+                builder.prefetch()
             builder.upload(pkg)
     finally:
         builder.cleanup(pkg)
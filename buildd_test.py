@@ -1,13 +1,15 @@
 #!/usr/bin/env python3
 
-import ctypes
-import ctypes.util
+import itertools
+import os
 import unittest
-from unittest.mock import patch, call
+from unittest.mock import MagicMock, patch, mock_open
 import signal
 import subprocess
 import threading
 
+import yaml
+
 import buildd
 
 _WB_LIST_OUTPUT = subprocess.CompletedProcess(
@@ -89,7 +91,7 @@ _SBUILD_UNKNOWN_OUTPUT = subprocess.CompletedProcess(
 # is still active at the point in time we check. 135DC390E4032D36
 # has been generated as the next key to use (and is hence already
 # valid).
-_GPG_KEYLIST = """\
+_GPG_KEYLIST = b"""\
 sec:e:4096:1:B424EB74051F4844:1398721900:1430257900::u:::sc:::+::::
 rvk:::1::::::F75FBFCD771DEB5E9C86050550C3634D3A291CF9:80:
 rvk:::17::::::E820094883974FDC3CD00EC699D399A1EC36A185:80:
@@ -116,30 +118,62 @@ _MOCK_DEFAULT_KEY = buildd.Key(
         email='buildd_arch-hostname@example.com')
 
 
+def _fake_wannabuild(listings, takes):
+    """Returns a subprocess.run side effect emulating wanna-build.
+
+    The queues are listed in parallel, so responses cannot be handed out
+    in call order. Instead listings maps 'arch/dist' to the response for
+    that queue (empty if missing) and takes is consumed in order by the
+    --take calls.
+    """
+    takes = iter(takes)
+    def run(args, **kwargs):
+        if args[-1] != '--list=needs-build':
+            return next(takes)
+        queue = '{}/{}'.format(args[-3][len('--arch='):],
+                               args[-2][len('--dist='):])
+        return listings.get(queue, _WB_LIST_EMPTY_OUTPUT)
+    return run
+
+
 class BuilderTest(unittest.TestCase):
-    def setUp(self):
-        self.config = {
+    @classmethod
+    def setUpClass(cls):
+        cls.config = {
             'architectures': 'amd64 i386',
             'distributions': 'sid experimental',
         }
+
+    def setUp(self):
+        # Builder caches the signing key and prefetched listings, so every
+        # test needs a fresh one.
         self.builder = buildd.Builder(self.config)
+        # Every test gets its own mocks, tests only configure what they
+        # expect to be returned.
+        run_patcher = patch('subprocess.run')
+        self.mock_run = run_patcher.start()
+        self.addCleanup(run_patcher.stop)
+        pick_gpg_key_patcher = patch('buildd._pick_gpg_key', autospec=True,
+                                     return_value=_MOCK_DEFAULT_KEY)
+        self.mock_pick_gpg_key = pick_gpg_key_patcher.start()
+        self.addCleanup(pick_gpg_key_patcher.stop)
 
-    @patch('subprocess.run', side_effect=[_WB_LIST_OUTPUT, _WB_TAKE_OUTPUT])
-    @patch('buildd._pick_gpg_key', return_value='ABCDEF1234567890')
-    def test_builds(self, mock_pick_gpg_key, mock_run):
+    def test_builds(self):
+        mock_run = self.mock_run
+        mock_run.side_effect = _fake_wannabuild(
+            {'amd64/sid': _WB_LIST_OUTPUT}, [_WB_TAKE_OUTPUT])
         pkg = next(self.builder.builds())
-        mock_run.assert_has_calls([
-            call(
-                args=self.builder._default_wannabuild_call +
-                ['--arch=amd64', '--dist=sid', '--list=needs-build'],
-                stdout=subprocess.PIPE),
-            call(
-                args=self.builder._default_wannabuild_call + [
-                    '--arch=amd64', '--dist=sid', '--take',
-                    'amd64/sid/chasquid_0.04-1'
-                ],
-                stdout=subprocess.PIPE),
-        ])
+        self.assertEqual(5, mock_run.call_count)
+        # The queues are listed in parallel, hence in no particular order.
+        self.assertIn(['--arch=amd64', '--dist=sid', '--list=needs-build'],
+                      [c[1]['args'][-3:] for c in mock_run.call_args_list])
+        take_args = mock_run.call_args[1]['args']
+        self.assertEqual(['--arch=amd64', '--dist=sid', '--take',
+                          'amd64/sid/chasquid_0.04-1'], take_args[-4:])
+        # Every query goes through the same ssh invocation.
+        base = list(self.builder._default_wannabuild_call)
+        for c in mock_run.call_args_list:
+            self.assertEqual(base, c[1]['args'][:len(base)])
         self.assertEqual(pkg.architecture, 'amd64')
         self.assertEqual(pkg.distribution, 'sid')
         self.assertEqual(pkg.source_package, 'chasquid')
@@ -150,25 +184,38 @@ class BuilderTest(unittest.TestCase):
         self.assertEqual(pkg.build_dep_resolver, 'aptitude')
         self.assertEqual(pkg.mail_logs, 'logs@example.com')
 
-    @patch(
-        'subprocess.run',
-        side_effect=[
-            _WB_LIST_OUTPUT, _WB_TAKE_FAILED_OUTPUT, _WB_LIST_OUTPUT,
-            _WB_TAKE_OUTPUT
-        ])
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    def test_builds_take_failed(self, mock_pick_gpg_key, mock_run):
+    def test_builds_take_failed(self):
+        self.mock_run.side_effect = _fake_wannabuild(
+            {'amd64/sid': _WB_LIST_OUTPUT, 'i386/sid': _WB_LIST_OUTPUT},
+            [_WB_TAKE_FAILED_OUTPUT, _WB_TAKE_OUTPUT])
         pkg = next(self.builder.builds())
         self.assertEqual(pkg.source_package, 'chasquid')
 
-    @patch('subprocess.run', side_effect=[_WB_LIST_EMPTY_OUTPUT] * 4)
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    def test_builds_empty_output(self, mock_pick_gpg_key, mock_run):
+    def test_builds_empty_output(self):
+        self.mock_run.side_effect = itertools.repeat(_WB_LIST_EMPTY_OUTPUT)
         self.assertEqual(next(self.builder.builds()), None)
 
-    @patch('subprocess.run', side_effect=[_WB_LIST_OUTPUT, _WB_TAKE_EPOCH_NMU_OUTPUT])
-    @patch('buildd._pick_gpg_key', return_value='ABCDEF1234567890')
-    def test_epoch_nmu_builds(self, mock_pick_gpg_key, mock_run):
+    def test_builds_idle_reuses_key(self):
+        self.mock_run.side_effect = itertools.repeat(_WB_LIST_EMPTY_OUTPUT)
+        self.mock_pick_gpg_key.return_value = buildd.Key(
+            keyid='DFE4C0B481F37BDB', expiry=7 * 24 * 60 * 60)
+        pkgs = self.builder.builds()
+        self.assertEqual(next(pkgs), None)
+        self.assertEqual(next(pkgs), None)
+        self.assertEqual(1, self.mock_pick_gpg_key.call_count)
+
+    def test_builds_prefetched(self):
+        self.mock_run.side_effect = _fake_wannabuild(
+            {'amd64/sid': _WB_LIST_OUTPUT}, [_WB_TAKE_OUTPUT])
+        self.builder.prefetch()
+        pkg = next(self.builder.builds())
+        self.assertEqual(pkg.source_package, 'chasquid')
+        # The queues must not be listed a second time.
+        self.assertEqual(5, self.mock_run.call_count)
+
+    def test_epoch_nmu_builds(self):
+        self.mock_run.side_effect = _fake_wannabuild(
+            {'amd64/sid': _WB_LIST_OUTPUT}, [_WB_TAKE_EPOCH_NMU_OUTPUT])
         pkg = next(self.builder.builds())
         self.assertEqual(pkg.architecture, 'amd64')
         self.assertEqual(pkg.distribution, 'sid')
@@ -182,6 +229,28 @@ class BuilderTest(unittest.TestCase):
         self.assertEqual(pkg.build_dep_resolver, 'aptitude')
         self.assertEqual(pkg.mail_logs, 'logs@example.com')
 
+    def test_wannabuild_call_control_persist(self):
+        self.assertNotIn('ControlMaster=auto',
+                         self.builder._default_wannabuild_call)
+        config = dict(self.config, wb_ssh_control_persist='10m')
+        cmd = buildd.Builder(config)._default_wannabuild_call
+        self.assertIn('ControlMaster=auto', cmd)
+        self.assertIn('ControlPersist=10m', cmd)
+        self.assertEqual(('buildd.debian.org', 'wanna-build', '--api=2'),
+                         cmd[-3:])
+
+    def test_current_key_cached(self):
+        key = buildd.Key(keyid='DFE4C0B481F37BDB', expiry=7 * 24 * 60 * 60)
+        self.mock_pick_gpg_key.return_value = key
+        with patch('time.time', return_value=1500000000):
+            self.assertIs(key, self.builder._current_key())
+            self.assertIs(key, self.builder._current_key())
+            self.assertEqual(1, self.mock_pick_gpg_key.call_count)
+        # Close to the expiry the key needs to be picked again.
+        with patch('time.time', return_value=1500000000 + key.expiry):
+            self.assertIs(key, self.builder._current_key())
+            self.assertEqual(2, self.mock_pick_gpg_key.call_count)
+
     def test_email_addresses(self):
         builder = buildd.Builder(self.config, hostname='host')
         pkg = buildd.Package(builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
@@ -193,11 +262,20 @@ class BuilderTest(unittest.TestCase):
             pkg.maintainer_email(buildd.Key(keyid='12345678ABCDEF12',
                                             email='buildd_arch-host@buildd.debian.org')))
         with patch('getpass.getuser', return_value='user'):
-            self.assertEqual('buildd on host <user@host>',
-                             builder._mail_from_email)
+            builder = buildd.Builder(self.config, hostname='host.example.com')
+        self.assertEqual('buildd on host <user@host.example.com>',
+                         builder._mail_from_email)
+
+    def test_package_metadata(self):
+        pkg = buildd.Package(self.builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
+                                                   'arch': 'arch',
+                                                   'suite': 'sid'})
+        metadata = pkg.metadata()
+        self.assertEqual('default', metadata['archive'])
+        self.assertEqual('pkg_1.2-3_arch.changes', metadata['changes_file'])
+        self.assertIsNone(metadata['binnmu'])
 
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    def test_construct_sbuild_cmd(self, mock_pick_gpg_key):
+    def test_construct_sbuild_cmd(self):
         builder = buildd.Builder(self.config, hostname='host')
         pkg = buildd.Package(builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
                                               'arch': 'arch',
@@ -212,89 +290,180 @@ class BuilderTest(unittest.TestCase):
         self.assertIn('--keyid=DFE4C0B481F37BDB', cmd)
         self.assertIn('--add-depends=glibc (>> 1)', cmd)
 
-    @patch('os.makedirs')
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    @patch('buildd.Builder._query_wannabuild')
-    @patch('subprocess.run', side_effect=[_SBUILD_SUCCESSFUL_OUTPUT])
-    def test_build_successful(self, mock_makedirs, mock_query_wannabuild,
-                              mock_pick_gpg_key, mock_run):
-        builder = buildd.Builder(self.config)
-        pkg = buildd.Package(builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
-                                              'arch': 'arch',
-                                              'archive': 'debian',
-                                              'suite': 'sid',
-                                              'extra-depends': 'glibc (>> 1)'})
-        self.assertTrue(builder.build(pkg))
-        self.assertTrue(mock_makedirs.called)
-        self.assertTrue(mock_run.called)
-        mock_query_wannabuild.assert_called_with(
-            'arch', 'sid', '--built', 'pkg_1.2-3')
-
-    @patch('os.makedirs')
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    @patch('buildd.Builder._query_wannabuild')
-    @patch('subprocess.run', side_effect=[_SBUILD_ATTEMPTED_OUTPUT])
-    def test_build_attempted(self, mock_makedirs, mock_query_wannabuild,
-                              mock_pick_gpg_key, mock_run):
-        builder = buildd.Builder(self.config)
-        pkg = buildd.Package(builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
-                                              'arch': 'arch',
-                                              'archive': 'debian',
-                                              'suite': 'sid',
-                                              'extra-depends': 'glibc (>> 1)'})
-        self.assertFalse(builder.build(pkg))
-        self.assertTrue(mock_makedirs.called)
-        self.assertTrue(mock_run.called)
-        mock_query_wannabuild.assert_called_with(
-            'arch', 'sid', '--attempted', 'pkg_1.2-3')
-
-    @patch('os.makedirs')
-    @patch('buildd._pick_gpg_key', return_value=_MOCK_DEFAULT_KEY)
-    @patch('buildd.Builder._query_wannabuild')
-    @patch('subprocess.run', side_effect=[_SBUILD_UNKNOWN_OUTPUT])
-    def test_build_unknown_failure(self, mock_makedirs, mock_query_wannabuild,
-                                   mock_pick_gpg_key, mock_run):
-        builder = buildd.Builder(self.config)
-        pkg = buildd.Package(builder, 'pkg', {'pkg-ver': 'pkg_1.2-3',
-                                              'arch': 'arch',
-                                              'archive': 'debian',
-                                              'suite': 'sid',
-                                              'extra-depends': 'glibc (>> 1)'})
-        self.assertFalse(builder.build(pkg))
-        self.assertTrue(mock_makedirs.called)
-        self.assertTrue(mock_run.called)
-        mock_query_wannabuild.assert_called_with(
-            'arch', 'sid', '--give-back', 'pkg_1.2-3')
+    def test_cleanup(self):
+        pkg = buildd.Package(self.builder, 'pkg', {'pkg-ver': 'pkg_1:1.2-3',
+                                                   'arch': 'arch',
+                                                   'suite': 'sid'})
+        self.builder.cleanup(pkg)
+        self.mock_run.assert_called_once_with(
+            ['rm', '-rf', '--', pkg.build_dir], check=True)
+        self.assertTrue(pkg.build_dir.endswith('/build/pkg_1.2-3'))
+
+    @patch('time.sleep')
+    def test_run_dupload_retries(self, mock_sleep):
+        mock_run = self.mock_run
+        mock_run.side_effect = [
+            subprocess.CalledProcessError(1, ['dupload']),
+            subprocess.CalledProcessError(1, ['dupload']),
+            _SBUILD_SUCCESSFUL_OUTPUT]
+        with self.assertLogs(level='ERROR') as logs:
+            self.builder._run_dupload('debian', '/build', 'pkg.changes')
+        self.assertEqual(2, len(logs.records))
+        self.assertEqual(3, mock_run.call_count)
+        self.assertEqual(2, mock_sleep.call_count)
+        for attempt, call in enumerate(mock_sleep.call_args_list):
+            delay = call[0][0]
+            min_delay = buildd._DUPLOAD_RETRY_DELAY * 2 ** attempt
+            self.assertLessEqual(min_delay, delay)
+            self.assertLessEqual(delay,
+                                 min_delay + buildd._DUPLOAD_RETRY_JITTER)
+
+    @patch('time.sleep')
+    def test_run_dupload_gives_up(self, mock_sleep):
+        mock_run = self.mock_run
+        mock_run.side_effect = subprocess.CalledProcessError(1, ['dupload'])
+        with self.assertLogs(level='ERROR') as logs, \
+                self.assertRaises(subprocess.CalledProcessError):
+            self.builder._run_dupload('debian', '/build', 'pkg.changes')
+        self.assertEqual(5, len(logs.records))
+        self.assertEqual(5, mock_run.call_count)
+        self.assertEqual(4, mock_sleep.call_count)
+
+
+@patch('buildd.open', mock_open(), create=True)
+@patch('os.makedirs')
+@patch('buildd._pick_gpg_key', autospec=True, return_value=_MOCK_DEFAULT_KEY)
+@patch('buildd.Builder._query_wannabuild', autospec=True)
+class BuildOutcomeTest(unittest.TestCase):
+    """Tests how sbuild's exit code is reported back to wanna-build."""
+
+    def setUp(self):
+        self.builder = buildd.Builder({'architectures': 'amd64'})
+        self.pkg = buildd.Package(self.builder, 'pkg',
+                                  {'pkg-ver': 'pkg_1.2-3',
+                                   'arch': 'arch',
+                                   'archive': 'debian',
+                                   'suite': 'sid',
+                                   'extra-depends': 'glibc (>> 1)'})
+
+    @patch('subprocess.run')
+    def test_build_outcomes(self, mock_run, mock_query_wannabuild,
+                            mock_pick_gpg_key, mock_makedirs):
+        cases = [(_SBUILD_SUCCESSFUL_OUTPUT, True, '--built'),
+                 (_SBUILD_ATTEMPTED_OUTPUT, False, '--attempted'),
+                 (_SBUILD_UNKNOWN_OUTPUT, False, '--give-back')]
+        for outcome, expected, wb_flag in cases:
+            with self.subTest(flag=wb_flag):
+                mock_run.reset_mock()
+                mock_makedirs.reset_mock()
+                mock_run.side_effect = [outcome]
+                self.assertEqual(expected, self.builder.build(self.pkg))
+                self.assertTrue(mock_makedirs.called)
+                self.assertEqual(subprocess.STDOUT,
+                                 mock_run.call_args[1]['stderr'])
+                mock_query_wannabuild.assert_called_with(
+                    self.builder, 'arch', 'sid', wb_flag, 'pkg_1.2-3')
 
 
 class BuilddTest(unittest.TestCase):
-    def test_gpg_key_selection(self):
+    @classmethod
+    def setUpClass(cls):
+        cls._parsed_keys = buildd._parse_gpg_keylist(_GPG_KEYLIST)
+
+    def _assert_take_fields_match_yaml(self, response):
+        parsed = buildd._parse_take_fields(response)
+        self.assertIsNotNone(parsed)
+        document = yaml.safe_load(response)[0]
+        self.assertEqual(1, len(document))
+        source_package, descriptor = next(iter(document.items()))
+        self.assertEqual(
+            (source_package,
+             {k: v for elem in descriptor for k, v in elem.items()}),
+            parsed)
+
+    def test_parse_take_fields(self):
+        response = _WB_TAKE_OUTPUT.stdout.decode('utf-8')
+        self._assert_take_fields_match_yaml(response)
+        # Tildes are common in Debian versions and need no quoting.
+        self._assert_take_fields_match_yaml(
+            response.replace('chasquid_0.04-1', 'chasquid_1.0~rc1-1'))
+        self._assert_take_fields_match_yaml(
+            response.replace('aptitude', 'glibc (>> 1~), libfoo | libbar'))
+        # Quoted strings and integers are left to the YAML parser.
+        self.assertIsNone(buildd._parse_take_fields(
+            _WB_TAKE_EPOCH_NMU_OUTPUT.stdout.decode('utf-8')))
+        self.assertIsNone(buildd._parse_take_fields(
+            _WB_TAKE_FAILED_OUTPUT.stdout.decode('utf-8')))
+
+    def test_parse_take_fields_rejects_other_layouts(self):
+        header = '---\n-\n  calligra:\n    -\n      status: ok\n'
+        responses = [
+            # A sibling of the package mapping, not one of its fields.
+            header + '  other: x\n',
+            # YAML reads this as calligra: None.
+            '- calligra:\n  status: ok\n',
+            # Nested mappings and values YAML refuses to parse.
+            header + '    -\n      mail_logs: foo: bar\n',
+            header + '    -\n      mail_logs: foo:\n',
+            header + '    -\n      a:\n',
+            # Scalars that YAML does not read as strings.
+            header + '    -\n      mail_logs: null\n',
+            header + '    -\n      mail_logs: 1.5\n',
+        ]
+        for response in responses:
+            with self.subTest(response=response):
+                self.assertIsNone(buildd._parse_take_fields(response))
+
+    def test_parse_gpg_keylist(self):
+        self.assertEqual(
+            ['B424EB74051F4844', 'DFE4C0B481F37BDB', '135DC390E4032D36'],
+            [record.keyid for record in self._parsed_keys])
+        self.assertEqual(1531173849.0, self._parsed_keys[2].expires)
+        self.assertEqual('buildd_arch-hostname@example.com',
+                         self._parsed_keys[0].email)
+
+    @patch('time.time')
+    def test_gpg_key_selection(self, mock_time):
         # Two active keys. Picks the one with the smallest TTL.
-        with patch('time.time', return_value=1500000000):
-            key = buildd._pick_gpg_key(_GPG_KEYLIST)
-            self.assertEqual('DFE4C0B481F37BDB', key.keyid)
-            self.assertEqual(1500323574.0-1500000000, key.expiry)
-            self.assertEqual('buildd_arch-hostname@example.com', key.email)
+        mock_time.return_value = 1500000000
+        key = buildd._pick_gpg_key_parsed(self._parsed_keys)
+        self.assertEqual('DFE4C0B481F37BDB', key.keyid)
+        self.assertEqual(1500323574.0-1500000000, key.expiry)
+        self.assertEqual('buildd_arch-hostname@example.com', key.email)
         # One active key some time later.
-        with patch('time.time', return_value=1518458890.395519):
-            key = buildd._pick_gpg_key(_GPG_KEYLIST)
-            self.assertEqual('135DC390E4032D36', key.keyid)
-            self.assertEqual(1531173849-1518458890.395519, key.expiry)
-            self.assertEqual('buildd_arch-hostname@example.com', key.email)
+        mock_time.return_value = 1518458890.395519
+        key = buildd._pick_gpg_key_parsed(self._parsed_keys)
+        self.assertEqual('135DC390E4032D36', key.keyid)
+        self.assertEqual(1531173849-1518458890.395519, key.expiry)
+        self.assertEqual('buildd_arch-hostname@example.com', key.email)
         # A year later: no active key.
-        with patch('time.time', return_value=1549994890.395519):
-            with self.assertRaises(buildd.KeyNotFoundError):
-                buildd._pick_gpg_key(_GPG_KEYLIST)
+        mock_time.return_value = 1549994890.395519
+        with self.assertRaises(buildd.KeyNotFoundError):
+            buildd._pick_gpg_key_parsed(self._parsed_keys)
+
+    @patch('subprocess.run', return_value=subprocess.CompletedProcess(
+        args=[], returncode=0, stdout=_GPG_KEYLIST))
+    def test_pick_gpg_key_runs_gpg(self, mock_run):
+        with patch('time.time', return_value=1500000000):
+            self.assertEqual('DFE4C0B481F37BDB', buildd._pick_gpg_key().keyid)
+        self.assertEqual(['gpg', '--with-colons', '--list-secret-keys'],
+                         mock_run.call_args[1]['args'])
 
     def test_exit_handler(self):
+        # Do not leak the handler into other tests run by the same process.
+        self.addCleanup(signal.signal, signal.SIGUSR1,
+                        signal.getsignal(signal.SIGUSR1))
         exit = buildd.setup_exit_handler()
         # TODO: With python3.8, this can be replaced with signal.raise_signal.
-        libc = ctypes.cdll.LoadLibrary(ctypes.util.find_library('c'))
-        getattr(libc, 'raise')(signal.SIGUSR1)
+        os.kill(os.getpid(), signal.SIGUSR1)
         self.assertTrue(exit.is_set())
 
-    @patch('buildd.Builder')
-    def test_handle_next_package(self, mock_builder):
+    def test_handle_next_package(self):
+        # Spec against an instance so that attributes set in
+        # Builder.__init__ are part of the mock's interface, too.
+        mock_builder = MagicMock(
+            spec_set=buildd.Builder({'architectures': 'arch'}))
+        mock_builder.idle_sleep_time = 0
         exit_event = threading.Event()
         pkg = buildd.Package(mock_builder, 'pkg',
             {'pkg-ver': 'pkg_1.2-3',
@@ -310,10 +479,10 @@ class BuilddTest(unittest.TestCase):
         self.assertTrue(
           buildd.handle_next_package(mock_builder, pkgs, exit_event))
         self.assertTrue(mock_builder.build.called)
+        self.assertTrue(mock_builder.prefetch.called)
         self.assertTrue(mock_builder.upload.called)
         self.assertTrue(mock_builder.cleanup.called)
         mock_builder.reset_mock()
-        mock_builder.idle_sleep_time = 0
         self.assertTrue(
           buildd.handle_next_package(mock_builder, pkgs, exit_event))
 